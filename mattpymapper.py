@@ -2,95 +2,487 @@
 """
 File-dependency mapper + maintenance helper.
 
+• Parses every module's imports once, in parallel, cached in
+  .mattpymapper_cache.json; the graph walk and the dependency check
+  both read from that single pass.
 • Builds an import graph from a chosen start-module.
-• Renders the graph as file_map.png.
+• Renders the graph as file_map.png (or .pdf/.svg with --format).
 • Lists unused project modules.
 • Optional actions:
    1. Move all unused modules to ./unused
    2. Detect & pip-install missing third-party packages
 """
 import os
+import re
 import sys
 import ast
+import json
+import mmap
+import atexit
+import tokenize
+import argparse
+import functools
+import hashlib
 import shutil
 import subprocess
 import importlib.util
-from typing import Set, Dict, Tuple, List
-
-import networkx as nx
-import matplotlib.pyplot as plt
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import TYPE_CHECKING, Any, FrozenSet, Optional, Set, Dict, Tuple, List
+
+# The plotting stack (numpy, networkx, matplotlib, optional scipy) is imported
+# inside the render helpers: under spawn/forkserver every parse worker
+# re-imports this script, and ~1 s of imports per worker would swamp the scan
+if TYPE_CHECKING:
+    import networkx as nx
+
+CACHE_FILE = ".mattpymapper_cache.json"
+CACHE_VERSION = 4  # bump whenever parse_imports changes what it reports
+# tokenize is backed by the C tokenizer from 3.12 on; before that the pure-Python
+# tokenizer is slower than a full ast.parse, so it isn't worth using
+FAST_TOKENIZE = sys.version_info >= (3, 12)
+# spring_layout is O(|V|²) per iteration; past this size hand off to Graphviz
+LARGE_GRAPH_NODES = 500
+# `import a.b [as c], d` / `from .x.y import` at a line start (or just after a
+# leading UTF-8 BOM) or after `:` / `;` (so `try: import x` and `x = 1; import y`
+# count too), matched in C by re
+IMPORT_RE = re.compile(
+    rb"(?m)(?:^|\A\xef\xbb\xbf|[:;])[ \t]*(?:import[ \t]+([\w.]+(?:[ \t]+as[ \t]+\w+)?(?:[ \t]*,[ \t]*[\w.]+(?:[ \t]+as[ \t]+\w+)?)*)"
+    rb"|from[ \t]+(\.*[\w.]*)[ \t]+import\b)"
+)
+# Below this many files to (re)parse, a worker pool's start-up (~0.1 s under
+# spawn/forkserver) costs more than the regex scan it would spread out
+PARALLEL_PARSE_MIN_FILES = 256
+# Files at least this big are scanned through mmap (shared page cache across the
+# parse workers); below it the extra mmap/munmap syscalls cost more than a read()
+MMAP_THRESHOLD = 64 * 1024
+# Label text layout dominates drawing time on big graphs; drop labels past this
+LABEL_LIMIT = 300
+# Never part of the project proper; hidden directories are skipped as well
+SKIP_DIRS = frozenset({
+    "__pycache__", "venv", "env", "node_modules", "site-packages",
+    "build", "dist", "unused",
+})
+
+
+# ──────────────────────────────── On-disk cache ────────────────────────────────
+def load_cache(cache_path: str) -> Dict[str, Any]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if isinstance(cache, dict) and cache.get("version") == CACHE_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {"version": CACHE_VERSION, "files": {}}
+
+
+def save_cache(cache: Dict[str, Any], cache_path: str) -> None:
+    # Write to a temp file and swap it in, so an interrupted run never
+    # leaves a truncated cache behind
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as exc:
+        print(f"⚠️  Could not write cache {cache_path}: {exc}", file=sys.stderr)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _cached_parse_imports(path: str, files_cache: Dict[str, Any]) -> Tuple[Tuple[int, int], Optional[Set[str]]]:
+    # (mtime_ns, size) is enough to spot edits without hashing file contents;
+    # a None result means the entry is missing or stale
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    entry = files_cache.get(path)
+    if entry and (entry["mtime_ns"], entry["size"]) == key:
+        return key, set(entry["imports"])
+    return key, None
+
+
+def _sys_path_key() -> str:
+    # find_spec answers only change when sys.path does or a directory on it
+    # gains/loses entries (a pip install bumps site-packages' mtime). A
+    # digest rather than hash(), which is salted per process for str.
+    h = hashlib.sha1()
+    for entry in sys.path:
+        try:
+            mtime_ns = os.stat(entry or ".").st_mtime_ns
+        except OSError:
+            mtime_ns = -1
+        h.update(f"{entry}\0{mtime_ns}\0".encode("utf-8", "surrogateescape"))
+    return h.hexdigest()
 
 
 # ────────────────────────────── Core mapping helpers ───────────────────────────
+def _scan_dir(dir_path: str, base_dir: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    found: List[Tuple[str, str]] = []
+    subdirs: List[str] = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                name = entry.name
+                # DirEntry caches d_type, so these checks cost no extra stat()
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in SKIP_DIRS and not name.startswith("."):
+                        subdirs.append(entry.path)
+                elif name == "pyvenv.cfg" and dir_path != base_dir:
+                    # a virtualenv under any name; drop the whole subtree
+                    return [], []
+                elif name.endswith(".py") and entry.is_file():
+                    rel_path = os.path.relpath(entry.path, base_dir)
+                    mod_name = rel_path[:-3].replace(os.path.sep, ".")
+                    found.append((mod_name, entry.path))
+    except OSError as exc:
+        print(f"⚠️  Could not scan {dir_path}: {exc}", file=sys.stderr)
+    return found, subdirs
+
+
 def build_module_map(base_dir: str) -> Dict[str, str]:
-    module_map = {}
-    for root, _, files in os.walk(base_dir):
-        for fname in files:
-            if fname.endswith(".py"):
-                full_path = os.path.join(root, fname)
-                rel_path = os.path.relpath(full_path, base_dir)
-                mod_name = rel_path[:-3].replace(os.path.sep, ".")
-                module_map[mod_name] = full_path
+    module_map: Dict[str, str] = {}
+    # The walk is I/O-bound (readdir latency), so oversubscribe the cores
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_scan_dir, base_dir, base_dir)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                found, subdirs = fut.result()
+                module_map.update(found)
+                for sub in subdirs:
+                    pending.add(executor.submit(_scan_dir, sub, base_dir))
     return module_map
 
 
-def parse_imports(file_path: str) -> Set[str]:
+def _scan_imports_tokenize(file_path: str, top_level_only: bool = False) -> Set[str]:
+    # Single token pass; only statement-initial `import` / `from` matter, so
+    # there is no AST to allocate or walk
+    imports: Set[str] = set()
+    state = ""  # "" | "import" | "from" | "skip" (rest of a from-import)
+    dotted = ""
+    skip_alias = False
+    stmt_start = True
+    # def/class tracking, only consulted when top_level_only is set
+    depth = 0
+    skip_depths: List[int] = []  # indent depths of def/class bodies
+    in_def_header = False  # inside `def ...:` / `class ...:` up to its NEWLINE
+    pending_body = False  # that header just ended; an INDENT opens its body
+
+    with open(file_path, "rb") as f:
+        for tok in tokenize.tokenize(f.readline):
+            ttype, tstr = tok.type, tok.string
+            if ttype in (tokenize.NL, tokenize.COMMENT):
+                continue
+            ends_stmt = ttype in (tokenize.NEWLINE, tokenize.ENDMARKER) or tstr == ";"
+
+            if ttype == tokenize.INDENT:
+                depth += 1
+                if pending_body:
+                    skip_depths.append(depth)
+            elif ttype == tokenize.DEDENT:
+                depth -= 1
+                while skip_depths and depth < skip_depths[-1]:
+                    skip_depths.pop()
+            pending_body = ttype == tokenize.NEWLINE and in_def_header
+
+            if state == "import":
+                if ttype == tokenize.NAME and tstr == "as":
+                    skip_alias = True
+                elif ttype == tokenize.NAME and skip_alias:
+                    skip_alias = False
+                elif ttype == tokenize.NAME or tstr == ".":
+                    dotted += tstr
+                elif tstr == "," or ends_stmt:
+                    if dotted:
+                        imports.add(dotted)
+                    dotted = ""
+            elif state == "from":
+                if ttype == tokenize.NAME and tstr == "import":
+                    # relative prefixes are dropped, as ast's node.module does
+                    module = dotted.lstrip(".")
+                    if module:
+                        imports.add(module)
+                    state = "skip"
+                elif ttype == tokenize.NAME or tstr in (".", "..."):
+                    dotted += tstr
+            elif stmt_start and ttype == tokenize.NAME:
+                if tstr in ("def", "class"):
+                    in_def_header = True
+                elif tstr in ("import", "from") and not (top_level_only and (skip_depths or in_def_header)):
+                    state, dotted, skip_alias = tstr, "", False
+
+            if ttype == tokenize.NEWLINE or ttype == tokenize.ENDMARKER:
+                in_def_header = False
+            if ends_stmt:
+                state = ""
+            stmt_start = (
+                ends_stmt
+                or ttype in (tokenize.INDENT, tokenize.DEDENT, tokenize.ENCODING)
+                or tstr == ":"
+                or (stmt_start and tstr == "async")
+            )
+    return imports
+
+
+def _parse_imports_ast(file_path: str, top_level_only: bool = False) -> Set[str]:
     imports: Set[str] = set()
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
+        # bytes in: the parser honours the encoding cookie and skips the str copy
+        with open(file_path, "rb") as f:
             tree = ast.parse(f.read(), filename=file_path)
     except Exception as exc:
         print(f"⚠️  Could not parse {file_path}: {exc}", file=sys.stderr)
         return imports
 
-    for node in ast.walk(tree):
+    # Imports are statements, so walk statement bodies only rather than
+    # every expression node as ast.walk would
+    stack: List[ast.AST] = list(tree.body)
+    while stack:
+        node = stack.pop()
         if isinstance(node, ast.Import):
             for alias in node.names:
                 imports.add(alias.name)
-        elif isinstance(node, ast.ImportFrom) and node.module:
-            imports.add(node.module)
+        elif isinstance(node, ast.ImportFrom):
+            if node.module:
+                imports.add(node.module)
+        elif top_level_only and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        else:
+            # if/try/with/for/while/match bodies, except handlers and match cases
+            for field in ("body", "orelse", "finalbody", "handlers", "cases"):
+                children = getattr(node, field, None)
+                if isinstance(children, list):
+                    stack.extend(children)
     return imports
 
 
-def resolve_and_dfs(start_mod: str, module_map: Dict[str, str]) -> Tuple[Set[str], List[Tuple[str, str]]]:
-    visited: Set[str] = set()
-    edges: List[Tuple[str, str]] = []
-
-    def _dfs(mod: str) -> None:
-        if mod in visited:
-            return
-        visited.add(mod)
-        path = module_map.get(mod)
-        if not path:
-            return
-
-        for imp in parse_imports(path):
-            root = imp.split(".")[0]
-            # prefer fully-qualified match; fall back to the root
-            target = imp if imp in module_map else root
-            if target in module_map:
-                edges.append((mod, target))
-                _dfs(target)
+def _scan_imports_regex(file_path: str) -> Set[str]:
+    # Fastest path: no lexing at all. Approximate by design; it can pick up
+    # import-looking text inside strings and misses backslash-continued
+    # statements and non-ASCII module names (use --strict for those)
+    imports: Set[str] = set()
+    with open(file_path, "rb") as f:
+        matches = None
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    matches = IMPORT_RE.findall(data)
+            except ValueError:  # emptied between fstat and mmap
+                pass
+        if matches is None:
+            matches = IMPORT_RE.findall(f.read())
+    for names, module in matches:
+        if names:
+            for name in names.split(b","):
+                imports.add(name.split()[0].decode("ascii"))
+        else:
+            module = module.lstrip(b".")
+            if module:
+                imports.add(module.decode("ascii"))
+    return imports
 
-    _dfs(start_mod)
-    return visited, edges
 
+def parse_imports(file_path: str, top_level_only: bool = False, strict: bool = False) -> Set[str]:
+    if not strict and not top_level_only:
+        try:
+            return _scan_imports_regex(file_path)
+        except OSError:
+            pass  # the AST path below reports it
+    if not FAST_TOKENIZE:
+        return _parse_imports_ast(file_path, top_level_only)
+    try:
+        return _scan_imports_tokenize(file_path, top_level_only)
+    except (tokenize.TokenError, SyntaxError, UnicodeDecodeError, OSError):
+        # let the AST path produce the diagnostic (or cope where tokenize can't)
+        return _parse_imports_ast(file_path, top_level_only)
+
+
+def precompute_all_imports(
+    module_map: Dict[str, str], cache: Dict[str, Any], top_level_only: bool = False, strict: bool = False
+) -> Dict[str, Set[str]]:
+    # Cached results are only reusable if they were parsed with the same options
+    options = {"top_level_only": top_level_only, "strict": strict}
+    old_files = cache.get("files", {}) if cache.get("parse_options") == options else {}
+    new_files: Dict[str, Any] = {}
+    imports_map: Dict[str, Set[str]] = {}
+    misses: List[Tuple[str, Tuple[int, int]]] = []
 
-def render_with_networkx(edges: List[Tuple[str, str]], output_png: str = "file_map.png") -> None:
+    for path in module_map.values():
+        try:
+            key, imports = _cached_parse_imports(path, old_files)
+        except OSError:
+            imports_map[path] = set()
+            continue
+        if imports is None:
+            misses.append((path, key))
+        else:
+            imports_map[path] = imports
+            new_files[path] = old_files[path]
+
+    if misses:
+        parse = functools.partial(parse_imports, top_level_only=top_level_only, strict=strict)
+        paths = [path for path, _ in misses]
+        cpu = os.cpu_count() or 1
+        if cpu == 1 or len(misses) < PARALLEL_PARSE_MIN_FILES:
+            results = [parse(path) for path in paths]
+        else:
+            # Parsing is CPU-bound, so spread it across processes (not threads)
+            chunksize = max(1, len(misses) // (4 * cpu))
+            with ProcessPoolExecutor(max_workers=cpu) as executor:
+                results = list(executor.map(parse, paths, chunksize=chunksize))
+        for (path, (mtime_ns, size)), imports in zip(misses, results):
+            imports_map[path] = imports
+            new_files[path] = {"mtime_ns": mtime_ns, "size": size, "imports": sorted(imports)}
+
+    # Rebuilding the section drops entries for files that no longer exist
+    cache["files"] = new_files
+    cache["parse_options"] = options
+    return imports_map
+
+
+def intern_modules(module_map: Dict[str, str]) -> Tuple[List[str], Dict[str, int]]:
+    # Small-int ids let the graph live in flat arrays instead of string tuples
+    id_to_name = sorted(module_map)
+    name_to_id = {name: i for i, name in enumerate(id_to_name)}
+    return id_to_name, name_to_id
+
+
+def resolve_and_dfs(
+    start_mod: str,
+    module_map: Dict[str, str],
+    imports_map: Dict[str, Set[str]],
+    id_to_name: List[str],
+    name_to_id: Dict[str, int],
+) -> Tuple[bytearray, "array[int]", "array[int]"]:
+    visited = bytearray(len(id_to_name))  # one flag per module id
+    src_ids: "array[int]" = array("i")
+    dst_ids: "array[int]" = array("i")
+
+    # Explicit stack: deep import chains can't hit the recursion limit
+    stack = [name_to_id[start_mod]]
+    while stack:
+        mod_id = stack.pop()
+        if visited[mod_id]:
+            continue
+        visited[mod_id] = 1
+
+        for imp in imports_map[module_map[id_to_name[mod_id]]]:
+            # prefer fully-qualified match; fall back to the root
+            target_id = name_to_id.get(imp)
+            if target_id is None:
+                target_id = name_to_id.get(imp.partition(".")[0])
+                if target_id is None:
+                    continue
+            src_ids.append(mod_id)
+            dst_ids.append(target_id)
+            stack.append(target_id)
+
+    return visited, src_ids, dst_ids
+
+
+def _lbfgs_layout(G: "nx.DiGraph", k: float = 0.5, iterations: int = 50, gravity: float = 1.0) -> Dict[Any, Any]:
+    # Fruchterman-Reingold energy minimised with L-BFGS (as in networkx#7889):
+    # attraction d³/3k along edges, repulsion -k²·ln d between all pairs, and
+    # a pull on each component's centroid so disconnected pieces stay close.
+    # Only used below LARGE_GRAPH_NODES, so dense n×n arrays are fine.
+    import numpy as np
+    import networkx as nx
+    from scipy.optimize import minimize
+    from scipy.sparse.csgraph import connected_components
+
+    nodes = list(G)
+    n = len(nodes)
+    if n == 0:
+        return {}
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=None).toarray()
+    A = np.maximum(A, A.T)
+    n_components, labels = connected_components(A, directed=False)
+    sizes = np.bincount(labels)
+
+    def _energy(x: "np.ndarray") -> Tuple[float, "np.ndarray"]:
+        pos = x.reshape((n, 2))
+        delta = pos[:, np.newaxis, :] - pos[np.newaxis, :, :]
+        dist2 = np.maximum(np.sum(delta * delta, axis=2), 1e-10)
+        dist = np.sqrt(dist2)
+        Ad = A * dist
+        grad = 2 * np.einsum("ij,ijk->ik", Ad / k - k**2 / dist2, delta)
+        cost = np.sum(Ad * dist2) / (3 * k) - k**2 * np.sum(np.log(dist))
+
+        centers = np.zeros((n_components, 2))
+        np.add.at(centers, labels, pos)
+        offset = centers / sizes[:, np.newaxis] - 0.5
+        grad += gravity * offset[labels]
+        cost += gravity * 0.5 * np.sum(sizes * np.sum(offset * offset, axis=1))
+        return cost, grad.ravel()
+
+    x0 = np.random.default_rng().random(n * 2)
+    result = minimize(_energy, x0, jac=True, method="L-BFGS-B", options={"maxiter": iterations})
+    pos = nx.rescale_layout(result.x.reshape((n, 2)))
+    return dict(zip(nodes, pos))
+
+
+def render_with_networkx(
+    src_ids: "array[int]",
+    dst_ids: "array[int]",
+    id_to_name: List[str],
+    output_path: str = "file_map.png",
+    prog: str = "sfdp",
+    label_limit: int = LABEL_LIMIT,
+) -> None:
+    import numpy as np
+    import networkx as nx
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    # Nodes stay integer ids; names only come back in as label text
     G = nx.DiGraph()
-    G.add_edges_from(edges)
-    pos = nx.spring_layout(G, k=0.5, iterations=50)
-
-    plt.figure(figsize=(12, 8))
-    nx.draw_networkx_nodes(G, pos, node_size=800, node_color="lightblue")
-    nx.draw_networkx_edges(G, pos, arrowstyle="->", arrowsize=12, edge_color="gray")
-    nx.draw_networkx_labels(G, pos, font_size=8, font_family="sans-serif")
+    G.add_edges_from(zip(src_ids, dst_ids))
+    if G.number_of_nodes() > LARGE_GRAPH_NODES:
+        try:
+            pos = nx.nx_pydot.graphviz_layout(G, prog=prog)
+        except Exception as exc:  # pydot or the Graphviz binaries are missing
+            print(f"⚠️  Graphviz '{prog}' layout unavailable ({exc}); using a random layout.", file=sys.stderr)
+            pos = nx.random_layout(G)
+    elif importlib.util.find_spec("scipy") is not None:  # optional; else spring_layout
+        pos = _lbfgs_layout(G, k=0.5, iterations=50)
+    else:
+        pos = nx.spring_layout(G, k=0.5, iterations=50)
+
+    # One LineCollection + one scatter instead of a patch per node and edge
+    nodes = list(G)
+    node_xy = np.array([pos[node] for node in nodes]).reshape(-1, 2)
+    edge_src = np.array([pos[u] for u, _ in G.edges()]).reshape(-1, 2)
+    edge_dst = np.array([pos[v] for _, v in G.edges()]).reshape(-1, 2)
+
+    _, ax = plt.subplots(figsize=(12, 8))
+    segments = list(np.stack([edge_src, edge_dst], axis=1))  # LineCollection is typed as taking a Sequence
+    ax.add_collection(LineCollection(segments, colors="gray", linewidths=0.5))
+    # direction markers part-way along each edge, drawn as a single quiver
+    vec = edge_dst - edge_src
+    moving = np.any(vec != 0, axis=1)  # self-loops have no direction
+    if moving.any():
+        tips = edge_src[moving] + 0.75 * vec[moving]
+        ax.quiver(
+            tips[:, 0], tips[:, 1], vec[moving, 0], vec[moving, 1], angles="xy", pivot="tip", color="gray",
+            headwidth=4, headlength=5, headaxislength=4.5, width=0.0015, minlength=0, zorder=1,
+        )
+    ax.scatter(node_xy[:, 0], node_xy[:, 1], s=800, c="lightblue", zorder=2)
+    if len(nodes) <= label_limit:
+        for node, (x, y) in zip(nodes, node_xy):
+            ax.text(x, y, id_to_name[node], fontsize=8, family="sans-serif", ha="center", va="center", zorder=3)
 
     plt.axis("off")
     plt.tight_layout()
-    plt.savefig(output_png, dpi=200)
+    # Vector output costs O(edges) rather than O(pixels); dpi only matters for rasters
+    if os.path.splitext(output_path)[1].lower() in (".pdf", ".svg"):
+        plt.savefig(output_path)
+    else:
+        plt.savefig(output_path, dpi=200)
     plt.close()
-    print(f"📊 Graph rendered to: {output_png}")
 
 
 # ─────────────────────────────── Maintenance tasks ─────────────────────────────
@@ -101,35 +493,79 @@ def move_unused_files(unused: Set[str], module_map: Dict[str, str], base_dir: st
 
     dest_root = os.path.join(base_dir, out_dir)
     os.makedirs(dest_root, exist_ok=True)
-
-    for mod in unused:
-        src_path = module_map[mod]
-        rel_parts = mod.split(".")  # preserve sub-folders
-        dest_path = os.path.join(dest_root, *rel_parts) + ".py"
-
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        shutil.move(src_path, dest_path)
+    # Same device → a plain rename; shutil.move adds stats and may copy+unlink
+    same_device = os.stat(base_dir).st_dev == os.stat(dest_root).st_dev
+
+    moves = [
+        (module_map[mod], os.path.join(dest_root, *mod.split(".")) + ".py")  # preserve sub-folders
+        for mod in unused
+    ]
+    for dest_dir in {os.path.dirname(dest_path) for _, dest_path in moves}:
+        os.makedirs(dest_dir, exist_ok=True)
+
+    for src_path, dest_path in moves:
+        if same_device:
+            try:
+                os.replace(src_path, dest_path)
+            except OSError:  # e.g. EXDEV from a mount inside the tree
+                shutil.move(src_path, dest_path)
+        else:
+            shutil.move(src_path, dest_path)
         print(f"➡️  Moved {src_path}  →  {dest_path}")
     print(f"✅ Unused modules relocated to ./{out_dir}/")
 
 
-def gather_all_import_roots(module_map: Dict[str, str]) -> Set[str]:
-    all_imports: Set[str] = set()
-    for path in module_map.values():
-        for imp in parse_imports(path):
-            all_imports.add(imp.split(".")[0])
-    return all_imports
+def gather_all_import_roots(imports_map: Dict[str, Set[str]]) -> FrozenSet[str]:
+    return frozenset(imp.partition(".")[0] for imports in imports_map.values() for imp in imports)
+
+
+def confirm_import_roots(roots: FrozenSet[str], imports_map: Dict[str, Set[str]]) -> FrozenSet[str]:
+    # The regex scan can read import-looking prose in docstrings as imports;
+    # re-parse just the files that contributed *roots* with the exact parser
+    confirmed: Set[str] = set()
+    for path, imports in imports_map.items():
+        if any(imp.partition(".")[0] in roots for imp in imports):
+            confirmed.update(imp.partition(".")[0] for imp in parse_imports(path, strict=True))
+    return frozenset(confirmed & roots)
 
 
-def install_missing_packages(import_roots: Set[str], module_map: Dict[str, str]) -> None:
+def install_missing_packages(
+    import_roots: FrozenSet[str],
+    internal_roots: FrozenSet[str],
+    cache: Optional[Dict[str, Any]] = None,
+    fast_imports_map: Optional[Dict[str, Set[str]]] = None,
+) -> None:
     # Anything in project modules is internal; skip them
-    internal_roots = {m.split(".")[0] for m in module_map}
     candidates = import_roots - internal_roots
 
+    # Settle stdlib and already-imported roots by set membership; only the
+    # rest need find_spec's sys.path search (stdlib_module_names is 3.10+)
+    stdlib = getattr(sys, "stdlib_module_names", frozenset()) | frozenset(sys.builtin_module_names)
+    already = frozenset(sys.modules)
+
+    # Earlier runs' find_spec answers stay valid while sys.path is unchanged
+    path_key = _sys_path_key()
+    spec_cache = cache.get("find_spec") if cache is not None else None
+    if not spec_cache or spec_cache.get("key") != path_key:
+        spec_cache = {"key": path_key, "roots": {}}
+    found_roots: Dict[str, bool] = spec_cache["roots"]
+
     missing: List[str] = []
     for root in candidates:
-        if importlib.util.find_spec(root) is None:
+        if root in stdlib or root in already:
+            continue
+        found = found_roots.get(root)
+        if found is None:
+            found = found_roots[root] = importlib.util.find_spec(root) is not None
+        if not found:
             missing.append(root)
+    if cache is not None:
+        cache["find_spec"] = spec_cache
+
+    # Never offer pip a name that only the approximate scan saw
+    if missing and fast_imports_map is not None:
+        confirmed = confirm_import_roots(frozenset(missing), fast_imports_map)
+        missing = [root for root in missing if root in confirmed]
 
     if not missing:
         print("🎉 No missing external packages detected.")
@@ -144,6 +580,19 @@ def install_missing_packages(import_roots: Set[str], module_map: Dict[str, str])
         print("❌  Installation skipped.")
         return
 
+    # One pip run resolves everything together and pays startup cost once
+    print(f"⏳ Installing {', '.join(missing)} ...")
+    try:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", *missing])
+        print("✅ All packages installed.")
+        return
+    except subprocess.CalledProcessError as exc:
+        if len(missing) == 1:
+            print(f"⚠️  Failed to install {missing[0]}: {exc}")
+            return
+        print(f"⚠️  Batch install failed ({exc}); retrying one package at a time.")
+
+    # pip installs nothing when any requirement fails, so find the culprits
     for pkg in missing:
         print(f"⏳ Installing {pkg} ...")
         try:
@@ -155,6 +604,38 @@ def install_missing_packages(import_roots: Set[str], module_map: Dict[str, str])
 
 # ─────────────────────────────────── main ──────────────────────────────────────
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Map a project's import graph and tidy up unused modules.")
+    parser.add_argument(
+        "--layout-prog",
+        default="sfdp",
+        choices=["sfdp", "neato", "fdp", "dot", "twopi", "circo"],
+        help=f"Graphviz layout program used for graphs over {LARGE_GRAPH_NODES} nodes (default: sfdp)",
+    )
+    parser.add_argument(
+        "--top-level-only",
+        action="store_true",
+        help="ignore imports inside function and class bodies (faster, but lazily imported modules look unused)",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="find imports with a real parser instead of the line-based fast scan "
+        "(no matches from import-like text in strings; catches backslash continuations and non-ASCII names)",
+    )
+    parser.add_argument(
+        "--format",
+        default="png",
+        choices=["png", "pdf", "svg"],
+        help="graph output format; pdf/svg are vector and much faster to save for large graphs (default: png)",
+    )
+    parser.add_argument(
+        "--label-limit",
+        type=int,
+        default=LABEL_LIMIT,
+        help=f"skip node labels on graphs with more nodes than this (default: {LABEL_LIMIT})",
+    )
+    args = parser.parse_args()
+
     base_dir = os.getcwd()
     start = input("▶️  Enter relative path to the starting .py file: ").strip()
     full_start = os.path.abspath(start)
@@ -171,12 +652,33 @@ def main() -> None:
         print("❌  Couldn’t map your start file to a module name.")
         sys.exit(1)
 
-    print(f"🔍 Scanning imports from module: {start_mod}")
-    visited, edges = resolve_and_dfs(start_mod, modules)
+    internal_roots = frozenset(m.partition(".")[0] for m in modules)
 
-    render_with_networkx(edges, output_png="file_map.png")
+    print(f"🔍 Scanning imports from module: {start_mod}")
+    cache_path = os.path.join(base_dir, CACHE_FILE)
+    cache = load_cache(cache_path)
+    atexit.register(save_cache, cache, cache_path)
+    imports_map = precompute_all_imports(
+        modules, cache, top_level_only=args.top_level_only, strict=args.strict
+    )
+    id_to_name, name_to_id = intern_modules(modules)
+    visited, src_ids, dst_ids = resolve_and_dfs(start_mod, modules, imports_map, id_to_name, name_to_id)
+
+    # Render in a worker process while the user reads the report and picks
+    # actions; matplotlib's C work would otherwise hold the GIL
+    output_path = f"file_map.{args.format}"
+    render_pool = ProcessPoolExecutor(max_workers=1)
+    render_future = render_pool.submit(
+        render_with_networkx,
+        src_ids,
+        dst_ids,
+        id_to_name,
+        output_path=output_path,
+        prog=args.layout_prog,
+        label_limit=args.label_limit,
+    )
 
-    unused = set(modules) - visited
+    unused = {name for mod_id, name in enumerate(id_to_name) if not visited[mod_id]}
     if unused:
         print("\n📄 Unused files:")
         for mod in sorted(unused):
@@ -198,9 +700,14 @@ def main() -> None:
         move_unused_files(unused, modules, base_dir)
 
     if "2" in choices:
-        roots = gather_all_import_roots(modules)
-        install_missing_packages(roots, modules)
-
+        roots = gather_all_import_roots(imports_map)
+        # imports_map came from the regex scan unless --strict/--top-level-only
+        fast_imports_map = None if args.strict or args.top_level_only else imports_map
+        install_missing_packages(roots, internal_roots, cache, fast_imports_map)
+
+    render_future.result()
+    render_pool.shutdown()
+    print(f"📊 Graph rendered to: {output_path}")
     print("✅ Done.")
 
 